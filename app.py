@@ -2,9 +2,18 @@ from flask import Flask, render_template, request, redirect, url_for, session, j
 import json
 import os
 import secrets
+import string
+import threading
+import time
 import bcrypt
+import orjson
+import hashlib
+import math
 import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
+from functools import lru_cache
 
 app = Flask(__name__)
 # Get secret key from environment variable, otherwise generate a random one
@@ -18,64 +27,117 @@ app.config.update(
     PERMANENT_SESSION_LIFETIME=timedelta(hours=24)
 )
 
-# Security Manager Class
-class SecurityManager:
-    @staticmethod
-    def hash_password(password):
-        """Hash password"""
-        salt = bcrypt.gensalt()
-        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
-    
-    @staticmethod
-    def verify_password(password, hashed):
-        """Verify password"""
+# bcrypt cost factor from environment variable, limited to a safe range
+try:
+    BCRYPT_COST = int(os.environ.get('BCRYPT_COST', '12'))
+except ValueError:
+    BCRYPT_COST = 12
+BCRYPT_COST = max(10, min(15, BCRYPT_COST))
+
+# Worker processes for bcrypt checks, 0 keeps them in the request thread
+try:
+    BCRYPT_WORKERS = max(0, int(os.environ.get('BCRYPT_WORKERS', '0')))
+except ValueError:
+    BCRYPT_WORKERS = 0
+_bcrypt_pool = ProcessPoolExecutor(max_workers=BCRYPT_WORKERS) if BCRYPT_WORKERS else None
+_bcrypt_pool_lock = threading.Lock()
+
+# Allowed username characters: ASCII letters, digits and underscore
+_USERNAME_CHARS = frozenset(string.ascii_letters + string.digits + '_')
+
+# Validation patterns, compiled once at import (used with fullmatch)
+_FOOD_RE = re.compile(r'[a-zA-Z0-9\s\-]+')
+_SANITIZE_RE = re.compile(r'[<>"\'&;]')
+
+# Security helpers
+
+# In-process cache of successful password checks, never persisted
+_verified_passwords = {}
+_VERIFIED_PASSWORDS_MAX = 4096
+_verified_passwords_lock = threading.Lock()
+
+# bcrypt only uses the first 72 bytes of a password
+_BCRYPT_MAX_PASSWORD_BYTES = 72
+
+def hash_password(password):
+    """Hash password, returns the bcrypt hash as bytes"""
+    salt = bcrypt.gensalt(rounds=BCRYPT_COST)
+    return bcrypt.hashpw(password.encode('utf-8')[:_BCRYPT_MAX_PASSWORD_BYTES], salt)
+
+def _bcrypt_checkpw(password_bytes, hashed):
+    """Run bcrypt.checkpw, in the worker pool when one is configured"""
+    global _bcrypt_pool
+    pool = _bcrypt_pool
+    if pool is not None:
         try:
-            return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
-        except Exception:
-            return False
-    
-    @staticmethod
-    def validate_username(username):
-        """Validate username format"""
-        if not username or len(username) < 3 or len(username) > 20:
-            return False
-        return bool(re.match(r'^[a-zA-Z0-9_]+$', username))
-    
-    @staticmethod
-    def validate_password(password):
-        """Validate password format"""
-        return password and len(password) >= 6
-    
-    @staticmethod
-    def validate_food_name(food_name):
-        """Validate food name"""
-        if not food_name or len(food_name) > 50:
+            return pool.submit(bcrypt.checkpw, password_bytes, hashed).result()
+        except BrokenProcessPool as e:
+            # A worker died, replace the pool once and check in this thread
+            print(f"bcrypt worker pool failed, restarting it: {e}")
+            with _bcrypt_pool_lock:
+                if _bcrypt_pool is pool:
+                    _bcrypt_pool = ProcessPoolExecutor(max_workers=BCRYPT_WORKERS)
+    return bcrypt.checkpw(password_bytes, hashed)
+
+def verify_password(password, hashed):
+    """Verify password against a bcrypt hash given as bytes"""
+    try:
+        password_bytes = password.encode('utf-8')[:_BCRYPT_MAX_PASSWORD_BYTES]
+        cache_key = hashlib.sha256(password_bytes).digest() + hashed
+        if cache_key in _verified_passwords:
+            return True
+        
+        if not _bcrypt_checkpw(password_bytes, hashed):
             return False
-        return bool(re.match(r'^[a-zA-Z0-9\s\-]+$', food_name))
-    
-    @staticmethod
-    def sanitize_input(input_str):
-        """Sanitize user input"""
-        if not input_str:
-            return ""
-        # Remove dangerous characters, keep basic characters
-        cleaned = re.sub(r'[<>"\'&;]', '', str(input_str))
-        return cleaned.strip()
-    
-    @staticmethod
-    def safe_float_convert(value, min_val=None, max_val=None):
-        """Safely convert to float"""
-        try:
-            if value is None or value == '':
-                return None
-            num = float(value)
-            if min_val is not None and num < min_val:
-                return min_val
-            if max_val is not None and num > max_val:
-                return max_val
-            return num
-        except (ValueError, TypeError):
+        
+        # Only cache successful checks, evict the oldest entry when full
+        with _verified_passwords_lock:
+            if len(_verified_passwords) >= _VERIFIED_PASSWORDS_MAX:
+                _verified_passwords.pop(next(iter(_verified_passwords)), None)
+            _verified_passwords[cache_key] = True
+        return True
+    except Exception:
+        return False
+
+def validate_username(username):
+    """Validate username format"""
+    if not username or len(username) < 3 or len(username) > 20:
+        return False
+    return _USERNAME_CHARS.issuperset(username)
+
+def validate_password(password):
+    """Validate password format"""
+    return password and len(password) >= 6
+
+def validate_food_name(food_name):
+    """Validate food name"""
+    if not food_name or len(food_name) > 50:
+        return False
+    return bool(_FOOD_RE.fullmatch(food_name))
+
+def sanitize_input(input_str):
+    """Sanitize user input"""
+    if not input_str:
+        return ""
+    # Remove dangerous characters, keep basic characters
+    cleaned = _SANITIZE_RE.sub('', str(input_str))
+    return cleaned.strip()
+
+def safe_float_convert(value, min_val=None, max_val=None):
+    """Safely convert to float"""
+    try:
+        if value is None or value == '':
+            return None
+        num = float(value)
+        if not math.isfinite(num):
             return None
+        if min_val is not None and num < min_val:
+            return min_val
+        if max_val is not None and num > max_val:
+            return max_val
+        return num
+    except (ValueError, TypeError):
+        return None
 
 # Food Database
 food_database = {
@@ -96,6 +158,13 @@ food_database = {
     'Carrot': {'calories': 41, 'protein': 0.9, 'carbs': 9.6, 'fat': 0.2, 'sugar': 4.7}
 }
 
+# Nutrients per 100g for each food, missing values filled with 0
+nutrient_keys = ('calories', 'protein', 'carbs', 'fat', 'sugar')
+food_nutrients = {
+    name: tuple(food.get(key, 0) for key in nutrient_keys)
+    for name, food in food_database.items()
+}
+
 # Diet Plan Templates
 diet_plan_templates = {
     'weight-loss': [
@@ -115,12 +184,70 @@ diet_plan_templates = {
     ]
 }
 
+# Total calories per template, used to scale meals to the daily target
+diet_plan_template_calories = {
+    goal: sum(meal['calories'] for meal in template)
+    for goal, template in diet_plan_templates.items()
+}
+
+# Daily calorie adjustment per goal
+goal_calorie_adjustments = {
+    'weight-loss': -400,
+    'muscle-gain': 300,
+    'maintenance': 0
+}
+
+# Last (second, ISO string) pair returned by _now_iso
+_last_iso_time = (0, '')
+
+def _now_iso():
+    """Current local time in ISO format, at one-second resolution"""
+    global _last_iso_time
+    now = int(time.time())
+    last = _last_iso_time
+    if now != last[0]:
+        last = (now, datetime.fromtimestamp(now).isoformat())
+        _last_iso_time = last
+    return last[1]
+
 class UserManager:
     def __init__(self):
         self.data_dir = 'data'
-        self.users_file = os.path.join(self.data_dir, 'users.json')
-        self._ensure_data_dir()
-        self.users = self.load_users()
+        # Append-only log of user records, one JSON object per line
+        self.users_file = os.path.join(self.data_dir, 'users.jsonl')
+        # Full JSON list written by older versions, migrated on first load
+        self.legacy_users_file = os.path.join(self.data_dir, 'users.json')
+        self._log_records = 0
+        self._load_failed = False
+        self.users = []
+        self._by_username = {}
+        self._password_hashes = {}
+        # User data is loaded on first use rather than at import, so bcrypt
+        # pool workers that re-import this module never touch the log
+        self._loaded = False
+        self._load_lock = threading.Lock()
+    
+    def _ensure_loaded(self):
+        """Load user data and compact the log once, on first use"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            self._ensure_data_dir()
+            self.users = self.load_users()
+            self._by_username = {user['username']: user for user in self.users}
+            # Password hashes encoded once, so logins don't re-encode them
+            for user in self.users:
+                if isinstance(user.get('password'), str):
+                    self._password_hashes[user['username']] = user['password'].encode('utf-8')
+                else:
+                    print(f"Warning: User {user['username']} has no stored password")
+            # Compact the log when it holds more records than users, but never
+            # overwrite a log that could not be read
+            if not self._load_failed and self._log_records != len(self.users):
+                self.save_users()
+            self._loaded = True
     
     def _ensure_data_dir(self):
         """Ensure data directory exists"""
@@ -131,22 +258,82 @@ class UserManager:
         """Safely load user data"""
         try:
             if os.path.exists(self.users_file):
-                with open(self.users_file, 'r', encoding='utf-8') as f:
-                    users = json.load(f)
+                return self._replay_log()
+            if os.path.exists(self.legacy_users_file):
+                # stdlib json accepts the NaN/Infinity literals older versions
+                # could write, orjson rejects them; store them as unset
+                with open(self.legacy_users_file, 'r', encoding='utf-8') as f:
+                    users = json.load(f, parse_constant=lambda constant: None)
                     if not isinstance(users, list):
                         print("Warning: User data format error, reset to empty list")
                         return []
-                    return users
+                    valid_users = [user for user in users if self._is_valid_record(user)]
+                    if len(valid_users) != len(users):
+                        print("Warning: Skipping user records without a username")
+                    return valid_users
             return []
         except Exception as e:
             print(f"Failed to load user data: {e}")
+            self._load_failed = True
             return []
     
+    @staticmethod
+    def _is_valid_record(record):
+        """Check that a stored user record can be indexed by username"""
+        return isinstance(record, dict) and isinstance(record.get('username'), str)
+    
+    def _replay_log(self):
+        """Rebuild the user list from the user log"""
+        users = []
+        by_username = {}
+        with open(self.users_file, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                # Corrupt lines count too, so the log gets compacted
+                self._log_records += 1
+                try:
+                    record = orjson.loads(line)
+                except ValueError:
+                    # A partially written last line after a crash
+                    print("Warning: Skipping corrupt user record")
+                    continue
+                if not self._is_valid_record(record):
+                    print("Warning: Skipping corrupt user record")
+                    continue
+                
+                op = record.pop('op', None)
+                if op == 'register':
+                    if record['username'] in by_username:
+                        # Never let a later record take over an existing account
+                        print(f"Warning: Skipping duplicate registration of {record['username']}")
+                        continue
+                    users.append(record)
+                    by_username[record['username']] = record
+                elif op == 'update' and record.get('username') in by_username:
+                    by_username[record['username']].update(record)
+        return users
+    
+    def _append_record(self, op, record):
+        """Safely append one record to the user log"""
+        try:
+            with open(self.users_file, 'ab') as f:
+                f.write(orjson.dumps({'op': op, **record}) + b'\n')
+            self._log_records += 1
+            return True
+        except Exception as e:
+            print(f"Failed to save user data: {e}")
+            return False
+    
     def save_users(self):
-        """Safely save user data"""
+        """Safely rewrite the user log with one record per user"""
         try:
-            with open(self.users_file, 'w', encoding='utf-8') as f:
-                json.dump(self.users, f, ensure_ascii=False, indent=2)
+            tmp_file = self.users_file + '.tmp'
+            with open(tmp_file, 'wb') as f:
+                for user in self.users:
+                    f.write(orjson.dumps({'op': 'register', **user}) + b'\n')
+            os.replace(tmp_file, self.users_file)
+            self._log_records = len(self.users)
             return True
         except Exception as e:
             print(f"Failed to save user data: {e}")
@@ -155,38 +342,44 @@ class UserManager:
     def register(self, username, password, nickname="", height=None, weight=None, target_weight=None):
         """Secure user registration"""
         try:
+            self._ensure_loaded()
+            if self._load_failed:
+                return False, "Registration failed: user data could not be loaded"
+            
             # Input validation
-            if not SecurityManager.validate_username(username):
+            if not validate_username(username):
                 return False, "Invalid username format (3-20 characters: letters, numbers, underscore)"
             
-            if not SecurityManager.validate_password(password):
+            if not validate_password(password):
                 return False, "Password must be at least 6 characters"
             
             # Check if username already exists
-            for user in self.users:
-                if user['username'] == username:
-                    return False, "Username already exists"
+            if username in self._by_username:
+                return False, "Username already exists"
             
             # Sanitize input
-            nickname = SecurityManager.sanitize_input(nickname)
-            height = SecurityManager.safe_float_convert(height, 100, 250)
-            weight = SecurityManager.safe_float_convert(weight, 30, 200)
-            target_weight = SecurityManager.safe_float_convert(target_weight, 30, 200)
+            nickname = sanitize_input(nickname)
+            height = safe_float_convert(height, 100, 250)
+            weight = safe_float_convert(weight, 30, 200)
+            target_weight = safe_float_convert(target_weight, 30, 200)
             
             # Create new user (password hashing)
+            hashed = hash_password(password)
             new_user = {
                 'username': username,
-                'password': SecurityManager.hash_password(password),
+                'password': hashed.decode('utf-8'),
                 'nickname': nickname,
                 'height': height,
                 'weight': weight,
                 'target_weight': target_weight,
                 'goal': 'maintenance',
-                'register_time': datetime.now().isoformat()
+                'register_time': _now_iso()
             }
             
             self.users.append(new_user)
-            if self.save_users():
+            self._by_username[username] = new_user
+            self._password_hashes[username] = hashed
+            if self._append_record('register', new_user):
                 return True, "Registration successful"
             else:
                 return False, "Registration failed: data save error"
@@ -197,134 +390,151 @@ class UserManager:
     def login(self, username, password):
         """Secure user login"""
         try:
-            for user in self.users:
-                if user['username'] == username:
-                    if SecurityManager.verify_password(password, user['password']):
-                        # Don't return password field
-                        user_data = user.copy()
-                        user_data.pop('password', None)
-                        return True, user_data
+            self._ensure_loaded()
+            user = self._by_username.get(username)
+            hashed = self._password_hashes.get(username)
+            if user and hashed and verify_password(password, hashed):
+                # Don't return password field
+                user_data = user.copy()
+                user_data.pop('password', None)
+                return True, user_data
             return False, "Incorrect username or password"
         except Exception as e:
             return False, f"Login failed: {str(e)}"
     
+    def get_user(self, username):
+        """Look up a user by username"""
+        self._ensure_loaded()
+        return self._by_username.get(username)
+    
     def update_profile(self, username, **kwargs):
         """Securely update user profile"""
         try:
-            for user in self.users:
-                if user['username'] == username:
-                    # Validate and sanitize input
-                    if 'nickname' in kwargs:
-                        kwargs['nickname'] = SecurityManager.sanitize_input(kwargs['nickname'])
-                    if 'height' in kwargs:
-                        kwargs['height'] = SecurityManager.safe_float_convert(kwargs['height'], 100, 250)
-                    if 'weight' in kwargs:
-                        kwargs['weight'] = SecurityManager.safe_float_convert(kwargs['weight'], 30, 200)
-                    if 'target_weight' in kwargs:
-                        kwargs['target_weight'] = SecurityManager.safe_float_convert(kwargs['target_weight'], 30, 200)
-                    if 'goal' in kwargs and kwargs['goal'] not in ['weight-loss', 'muscle-gain', 'maintenance']:
-                        return False, "Invalid goal type"
-                    
-                    for key, value in kwargs.items():
-                        if value is not None:
-                            user[key] = value
-                    
-                    if self.save_users():
-                        return True, "Profile updated successfully"
-                    else:
-                        return False, "Profile update failed: data save error"
-            return False, "User does not exist"
+            self._ensure_loaded()
+            if self._load_failed:
+                return False, "Profile update failed: user data could not be loaded"
+            
+            user = self._by_username.get(username)
+            if not user:
+                return False, "User does not exist"
+            
+            # Validate and sanitize input
+            if 'nickname' in kwargs:
+                kwargs['nickname'] = sanitize_input(kwargs['nickname'])
+            if 'height' in kwargs:
+                kwargs['height'] = safe_float_convert(kwargs['height'], 100, 250)
+            if 'weight' in kwargs:
+                kwargs['weight'] = safe_float_convert(kwargs['weight'], 30, 200)
+            if 'target_weight' in kwargs:
+                kwargs['target_weight'] = safe_float_convert(kwargs['target_weight'], 30, 200)
+            if 'goal' in kwargs and kwargs['goal'] not in ['weight-loss', 'muscle-gain', 'maintenance']:
+                return False, "Invalid goal type"
+            
+            changes = {key: value for key, value in kwargs.items() if value is not None}
+            user.update(changes)
+            
+            if self._append_record('update', {'username': username, **changes}):
+                return True, "Profile updated successfully"
+            else:
+                return False, "Profile update failed: data save error"
         except Exception as e:
             return False, f"Profile update failed: {str(e)}"
 
+@lru_cache(maxsize=256)
+def _generate_diet_plan_cached(goal, daily_calories):
+    """Scale the goal template to the daily calories (cached)"""
+    template = diet_plan_templates[goal]
+    calorie_ratio = daily_calories / diet_plan_template_calories[goal]
+    
+    # Generate plan based on template
+    basic_plan = []
+    for meal in template:
+        basic_plan.append({
+            'name': meal['name'],
+            'calories': max(100, round(meal['calories'] * calorie_ratio)),
+            'protein': max(5, round(meal['protein'] * calorie_ratio)),
+            'carbs': max(10, round(meal['carbs'] * calorie_ratio)),
+            'fat': max(5, round(meal['fat'] * calorie_ratio))
+        })
+    
+    return tuple(basic_plan)
+
+@lru_cache(maxsize=1024)
+def _analyze_food_cached(food_name, amount):
+    """Analyze food nutrition for a validated amount (cached)"""
+    # Validate input
+    if not validate_food_name(food_name):
+        return False, "Invalid food name"
+    
+    nutrients = food_nutrients.get(food_name)
+    if nutrients is not None:
+        calories, protein, carbs, fat, sugar = nutrients
+        ratio = amount / 100
+        
+        analysis = {
+            'calories': max(0, round(calories * ratio)),
+            'protein': max(0, round(protein * ratio * 10) / 10),
+            'carbs': max(0, round(carbs * ratio * 10) / 10),
+            'fat': max(0, round(fat * ratio * 10) / 10),
+            'sugar': max(0, round(sugar * ratio * 10) / 10)
+        }
+        
+        return True, analysis
+    else:
+        return False, "Sorry, this food was not found in the database"
+
 class DietPlanGenerator:
     def __init__(self):
         self.food_database = food_database
     
     def calculate_daily_calories(self, user_data):
         """Calculate daily required calories"""
-        try:
-            height = user_data.get('height') or 170
-            weight = user_data.get('weight') or 65
-            goal = user_data.get('goal', 'maintenance')
-            
-            # Basal metabolic rate calculation
-            base_calories = 10 * weight + 6.25 * height - 5 * 25 + 5
-            
-            # Adjust based on goal
-            if goal == 'weight-loss':
-                base_calories -= 400
-            elif goal == 'muscle-gain':
-                base_calories += 300
-            
-            return max(1200, int(base_calories))  # Minimum 1200 calories
-        except Exception:
+        height = user_data.get('height') or 170
+        weight = user_data.get('weight') or 65
+        goal = user_data.get('goal', 'maintenance')
+        
+        # Basal metabolic rate calculation
+        base_calories = 10 * weight + 6.25 * height - 5 * 25 + 5
+        
+        # Adjust based on goal
+        base_calories += goal_calorie_adjustments.get(goal, 0)
+        
+        if not math.isfinite(base_calories):
             return 2000  # Default value
+        return max(1200, int(base_calories))  # Minimum 1200 calories
     
     def generate_diet_plan(self, user_data):
         """Generate diet plan"""
         try:
             daily_calories = self.calculate_daily_calories(user_data)
             goal = user_data.get('goal', 'maintenance')
+            if goal not in diet_plan_templates:
+                goal = 'maintenance'
             
-            # Use template
-            template = diet_plan_templates.get(goal, diet_plan_templates['maintenance'])
-            total_template_calories = sum(meal['calories'] for meal in template)
-            calorie_ratio = daily_calories / total_template_calories
-            
-            # Generate plan based on template
-            basic_plan = []
-            for meal in template:
-                basic_plan.append({
-                    'name': meal['name'],
-                    'calories': max(100, round(meal['calories'] * calorie_ratio)),
-                    'protein': max(5, round(meal['protein'] * calorie_ratio)),
-                    'carbs': max(10, round(meal['carbs'] * calorie_ratio)),
-                    'fat': max(5, round(meal['fat'] * calorie_ratio))
-                })
-            
-            return basic_plan
+            # Copy meals so callers can't modify the cached plan
+            return [dict(meal) for meal in _generate_diet_plan_cached(goal, daily_calories)]
         except Exception:
             return []
     
     def analyze_food(self, food_name, amount=100):
         """Safely analyze food nutrition"""
-        try:
-            # Validate input
-            if not SecurityManager.validate_food_name(food_name):
-                return False, "Invalid food name"
-            
-            amount = SecurityManager.safe_float_convert(amount, 1, 10000) or 100
-            
-            if food_name in self.food_database:
-                food = self.food_database[food_name]
-                ratio = amount / 100
-                
-                analysis = {
-                    'calories': max(0, round(food['calories'] * ratio)),
-                    'protein': max(0, round(food['protein'] * ratio * 10) / 10),
-                    'carbs': max(0, round(food['carbs'] * ratio * 10) / 10),
-                    'fat': max(0, round(food['fat'] * ratio * 10) / 10),
-                    'sugar': max(0, round(food.get('sugar', 0) * ratio * 10) / 10)
-                }
-                
-                return True, analysis
-            else:
-                return False, "Sorry, this food was not found in the database"
-        except Exception as e:
-            return False, f"Analysis failed: {str(e)}"
+        amount = safe_float_convert(amount, 1, 10000) or 100
+        
+        # Round amount to bound the number of cached entries
+        success, result = _analyze_food_cached(food_name, round(amount, 1))
+        if success:
+            # Copy so callers can't modify the cached analysis
+            result = dict(result)
+        return success, result
     
     def calculate_bmi(self, height, weight):
         """Calculate BMI"""
-        try:
-            if not height or not weight:
-                return None
-            
-            height_in_meters = height / 100
-            bmi = weight / (height_in_meters * height_in_meters)
-            return max(10, min(50, round(bmi, 1)))  # Limit range
-        except Exception:
+        if not height or not weight or not math.isfinite(height) or not math.isfinite(weight):
             return None
+        
+        height_in_meters = height / 100
+        bmi = weight / (height_in_meters * height_in_meters)
+        return max(10, min(50, round(bmi, 1)))  # Limit range
     
     def get_bmi_status(self, bmi):
         """Get BMI status"""
@@ -361,195 +571,171 @@ def handle_exception(error):
 # Route definitions
 @app.route('/')
 def index():
-    try:
-        if 'user' in session:
-            user = session['user']
-            # Calculate BMI for homepage display
-            bmi = diet_generator.calculate_bmi(user.get('height'), user.get('weight'))
-            bmi_status = diet_generator.get_bmi_status(bmi)
-            
-            return render_template('index.html', 
-                                 user=user, 
-                                 bmi=bmi, 
-                                 bmi_status=bmi_status,
-                                 diet_generator=diet_generator)
-        return redirect(url_for('login'))
-    except Exception as e:
-        return render_template('error.html', error=str(e)), 500
+    if 'user' in session:
+        user = session['user']
+        # Calculate BMI for homepage display
+        bmi = diet_generator.calculate_bmi(user.get('height'), user.get('weight'))
+        bmi_status = diet_generator.get_bmi_status(bmi)
+        
+        return render_template('index.html', 
+                             user=user, 
+                             bmi=bmi, 
+                             bmi_status=bmi_status,
+                             diet_generator=diet_generator)
+    return redirect(url_for('login'))
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
-    try:
-        if request.method == 'POST':
-            username = SecurityManager.sanitize_input(request.form.get('username', ''))
-            password = request.form.get('password', '')
-            
-            if not username or not password:
-                return render_template('login.html', error="Please enter username and password")
-            
-            success, result = user_manager.login(username, password)
-            if success:
-                session.permanent = True
-                session['user'] = result
-                return redirect(url_for('index'))
-            else:
-                return render_template('login.html', error=result)
+    if request.method == 'POST':
+        username = sanitize_input(request.form.get('username', ''))
+        password = request.form.get('password', '')
+        
+        if not username or not password:
+            return render_template('login.html', error="Please enter username and password")
         
-        return render_template('login.html')
-    except Exception as e:
-        return render_template('error.html', error=str(e)), 500
+        success, result = user_manager.login(username, password)
+        if success:
+            session.permanent = True
+            session['user'] = result
+            return redirect(url_for('index'))
+        else:
+            return render_template('login.html', error=result)
+    
+    return render_template('login.html')
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
-    try:
-        if request.method == 'POST':
-            username = SecurityManager.sanitize_input(request.form.get('username', ''))
-            password = request.form.get('password', '')
-            confirm_password = request.form.get('confirm_password', '')
-            nickname = SecurityManager.sanitize_input(request.form.get('nickname', ''))
-            
-            if not username or not password:
-                return render_template('register.html', error="Please enter username and password")
-            
-            if password != confirm_password:
-                return render_template('register.html', error="Passwords do not match")
-            
-            # Handle optional fields
-            height = request.form.get('height')
-            weight = request.form.get('weight')
-            target_weight = request.form.get('target_weight')
-            
-            success, message = user_manager.register(
-                username, password, nickname, height, weight, target_weight
-            )
-            
-            if success:
-                return redirect(url_for('login'))
-            else:
-                return render_template('register.html', error=message)
+    if request.method == 'POST':
+        username = sanitize_input(request.form.get('username', ''))
+        password = request.form.get('password', '')
+        confirm_password = request.form.get('confirm_password', '')
+        nickname = sanitize_input(request.form.get('nickname', ''))
+        
+        if not username or not password:
+            return render_template('register.html', error="Please enter username and password")
+        
+        if password != confirm_password:
+            return render_template('register.html', error="Passwords do not match")
+        
+        # Handle optional fields
+        height = request.form.get('height')
+        weight = request.form.get('weight')
+        target_weight = request.form.get('target_weight')
+        
+        success, message = user_manager.register(
+            username, password, nickname, height, weight, target_weight
+        )
         
-        return render_template('register.html')
-    except Exception as e:
-        return render_template('error.html', error=str(e)), 500
+        if success:
+            return redirect(url_for('login'))
+        else:
+            return render_template('register.html', error=message)
+    
+    return render_template('register.html')
 
 @app.route('/logout')
 def logout():
-    try:
-        session.pop('user', None)
-        return redirect(url_for('login'))
-    except Exception as e:
-        return render_template('error.html', error=str(e)), 500
+    session.pop('user', None)
+    return redirect(url_for('login'))
 
 @app.route('/profile', methods=['GET', 'POST'])
 def profile():
-    try:
-        if 'user' not in session:
-            return redirect(url_for('login'))
-        
-        message = None
-        
-        if request.method == 'POST':
-            username = session['user']['username']
-            nickname = request.form.get('nickname')
-            height = request.form.get('height')
-            weight = request.form.get('weight')
-            target_weight = request.form.get('target_weight')
-            goal = request.form.get('goal')
-            
-            # Prepare update data
-            update_data = {}
-            if nickname is not None:
-                update_data['nickname'] = nickname
-            if height:
-                update_data['height'] = height
-            if weight:
-                update_data['weight'] = weight
-            if target_weight:
-                update_data['target_weight'] = target_weight
-            if goal:
-                update_data['goal'] = goal
-            
-            success, message = user_manager.update_profile(username, **update_data)
-            if success:
-                # Update user info in session
-                for user in user_manager.users:
-                    if user['username'] == username:
-                        user_data = user.copy()
-                        user_data.pop('password', None)
-                        session['user'] = user_data
-                        break
+    if 'user' not in session:
+        return redirect(url_for('login'))
+    
+    message = None
+    
+    if request.method == 'POST':
+        username = session['user']['username']
+        nickname = request.form.get('nickname')
+        height = request.form.get('height')
+        weight = request.form.get('weight')
+        target_weight = request.form.get('target_weight')
+        goal = request.form.get('goal')
         
-        # Calculate BMI for display
-        user_data = session['user']
-        bmi = diet_generator.calculate_bmi(user_data.get('height'), user_data.get('weight'))
-        bmi_status = diet_generator.get_bmi_status(bmi)
+        # Prepare update data
+        update_data = {}
+        if nickname is not None:
+            update_data['nickname'] = nickname
+        if height:
+            update_data['height'] = height
+        if weight:
+            update_data['weight'] = weight
+        if target_weight:
+            update_data['target_weight'] = target_weight
+        if goal:
+            update_data['goal'] = goal
         
-        return render_template('profile.html', 
-                             user=session['user'], 
-                             message=message,
-                             bmi=bmi,
-                             bmi_status=bmi_status,
-                             diet_generator=diet_generator)
-    except Exception as e:
-        return render_template('error.html', error=str(e)), 500
+        success, message = user_manager.update_profile(username, **update_data)
+        if success:
+            # Update user info in session
+            user_data = user_manager.get_user(username).copy()
+            user_data.pop('password', None)
+            session['user'] = user_data
+    
+    # Calculate BMI for display
+    user_data = session['user']
+    bmi = diet_generator.calculate_bmi(user_data.get('height'), user_data.get('weight'))
+    bmi_status = diet_generator.get_bmi_status(bmi)
+    
+    return render_template('profile.html', 
+                         user=session['user'], 
+                         message=message,
+                         bmi=bmi,
+                         bmi_status=bmi_status,
+                         diet_generator=diet_generator)
 
 @app.route('/diet-plan')
 def diet_plan():
-    try:
-        if 'user' not in session:
-            return redirect(url_for('login'))
-        
-        user = session['user']
-        plan = diet_generator.generate_diet_plan(user)
-        
-        # Calculate BMI
-        bmi = diet_generator.calculate_bmi(user.get('height'), user.get('weight'))
-        bmi_status = diet_generator.get_bmi_status(bmi)
-        
-        return render_template('diet_plan.html', 
-                             user=user, 
-                             plan=plan, 
-                             bmi=bmi, 
-                             bmi_status=bmi_status,
-                             diet_generator=diet_generator)
-    except Exception as e:
-        return render_template('error.html', error=str(e)), 500
+    if 'user' not in session:
+        return redirect(url_for('login'))
+    
+    user = session['user']
+    plan = diet_generator.generate_diet_plan(user)
+    
+    # Calculate BMI
+    bmi = diet_generator.calculate_bmi(user.get('height'), user.get('weight'))
+    bmi_status = diet_generator.get_bmi_status(bmi)
+    
+    return render_template('diet_plan.html', 
+                         user=user, 
+                         plan=plan, 
+                         bmi=bmi, 
+                         bmi_status=bmi_status,
+                         diet_generator=diet_generator)
 
 @app.route('/nutrition-analysis', methods=['GET', 'POST'])
 def nutrition_analysis():
-    try:
-        if 'user' not in session:
-            return redirect(url_for('login'))
-        
-        analysis_result = None
-        error = None
+    if 'user' not in session:
+        return redirect(url_for('login'))
+    
+    analysis_result = None
+    error = None
+    
+    if request.method == 'POST':
+        food_name = sanitize_input(request.form.get('food_name', ''))
+        amount = request.form.get('amount', '100')
         
-        if request.method == 'POST':
-            food_name = SecurityManager.sanitize_input(request.form.get('food_name', ''))
-            amount = request.form.get('amount', '100')
+        if not food_name:
+            error = "Please enter food name"
+        else:
+            success, result = diet_generator.analyze_food(food_name, amount)
             
-            if not food_name:
-                error = "Please enter food name"
+            if success:
+                analysis_result = {
+                    'food_name': food_name,
+                    'amount': safe_float_convert(amount, 1, 10000) or 100.0,
+                    'nutrition': result
+                }
             else:
-                success, result = diet_generator.analyze_food(food_name, amount)
-                
-                if success:
-                    analysis_result = {
-                        'food_name': food_name,
-                        'amount': float(amount),
-                        'nutrition': result
-                    }
-                else:
-                    error = result
-        
-        return render_template('nutrition.html', 
-                             user=session['user'],
-                             analysis_result=analysis_result,
-                             error=error,
-                             diet_generator=diet_generator,
-                             food_database=food_database)
-    except Exception as e:
-        return render_template('error.html', error=str(e)), 500
+                error = result
+    
+    return render_template('nutrition.html', 
+                         user=session['user'],
+                         analysis_result=analysis_result,
+                         error=error,
+                         diet_generator=diet_generator,
+                         food_database=food_database)
 
 if __name__ == '__main__':
     debug_mode = os.environ.get('DEBUG', 'True').lower() == 'true'